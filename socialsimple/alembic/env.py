@@ -0,0 +1,40 @@
+import asyncio
+from logging.config import fileConfig
+from sqlalchemy.engine import Connection
+from alembic import context
+from app.db import Base, DATABASE_URL, engine
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+#autogenerate compares the database against our models through this
+
+def run_migrations_offline() -> None:
+    """writes the migration sql out instead of running it (alembic upgrade head --sql)"""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=connection.dialect.name == "sqlite")
+    #sqlite cant alter columns in place, batch mode rebuilds the table instead
+    with context.begin_transaction():
+        context.run_migrations()
+
+async def run_async_migrations() -> None:
+    """runs the migrations on the same engine the app uses, so the url and driver settings only live in one place"""
+    async with engine.begin() as conn:
+        await conn.run_sync(do_run_migrations)
+    await engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,100 @@
+"""posts: db side defaults for id and created_at, the feed indexes, and user_id stored like user.id
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-15
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from fastapi_users_db_sqlalchemy.generics import GUID
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+SQLITE_REFLECT_ARGS = [
+    sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+    sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("user.id"), nullable=False),
+]
+#sqlite rebuilds the table in batch mode, and it would otherwise read the UUID columns back as NUMERIC
+SQLITE_DASHED_USER_ID = (
+    "substr(user_id, 1, 8) || '-' || substr(user_id, 9, 4) || '-' || substr(user_id, 13, 4)"
+    " || '-' || substr(user_id, 17, 4) || '-' || substr(user_id, 21)"
+)
+#on sqlite, posts.user_id used to be written as 32 char hex while user.id is dashed, so the two never matched in a join
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(f"UPDATE posts SET created_at = {SQLITE_NOW} WHERE created_at IS NULL")
+        op.execute(f"UPDATE posts SET user_id = {SQLITE_DASHED_USER_ID} WHERE length(user_id) = 32")
+        with op.batch_alter_table("posts", reflect_args=SQLITE_REFLECT_ARGS) as batch_op:
+            batch_op.alter_column(
+                "user_id",
+                existing_type=postgresql.UUID(as_uuid=True),
+                type_=GUID(),
+                existing_nullable=False,
+            )
+            batch_op.alter_column(
+                "created_at",
+                existing_type=sa.DateTime(),
+                type_=sa.DateTime(timezone=True),
+                server_default=sa.text(f"({SQLITE_NOW})"),
+                nullable=False,
+            )
+    else:
+        op.execute("UPDATE posts SET created_at = now() WHERE created_at IS NULL")
+        op.alter_column(
+            "posts",
+            "created_at",
+            existing_type=sa.DateTime(),
+            type_=sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+            postgresql_using="created_at AT TIME ZONE 'UTC'",
+        )
+        op.alter_column(
+            "posts",
+            "id",
+            existing_type=postgresql.UUID(as_uuid=True),
+            server_default=sa.text("gen_random_uuid()"),
+        )
+    op.create_index("ix_posts_created_id", "posts", [sa.text("created_at DESC"), sa.text("id DESC")])
+    op.create_index("ix_posts_user_created", "posts", ["user_id", sa.text("created_at DESC")])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_posts_user_created", table_name="posts")
+    op.drop_index("ix_posts_created_id", table_name="posts")
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("UPDATE posts SET user_id = replace(user_id, '-', '') WHERE length(user_id) = 36")
+        with op.batch_alter_table("posts", reflect_args=SQLITE_REFLECT_ARGS) as batch_op:
+            #user_id goes back to UUID through reflect_args, an alter_column type change would copy the rows with CAST(... AS NUMERIC) and mangle them
+            batch_op.alter_column(
+                "created_at",
+                existing_type=sa.DateTime(timezone=True),
+                type_=sa.DateTime(),
+                server_default=None,
+                nullable=True,
+            )
+    else:
+        op.alter_column("posts", "id", existing_type=postgresql.UUID(as_uuid=True), server_default=None)
+        op.alter_column(
+            "posts",
+            "created_at",
+            existing_type=sa.DateTime(timezone=True),
+            type_=sa.DateTime(),
+            server_default=None,
+            nullable=True,
+            postgresql_using="created_at AT TIME ZONE 'UTC'",
+        )
@@ -1,20 +1,29 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from app.schemas import PostCreate, PostResponse, UserRead, UserCreate, UserUpdate
 from app.db import Post, create_db_and_tables, get_async_session, User
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
-from sqlalchemy import select
-from app.images import imagekit
+from sqlalchemy import RowMapping, select, insert, delete, tuple_, lambda_stmt, bindparam
+from app.images import imagekit, IMAGEKIT_PUBLIC_KEY, IMAGEKIT_URL
 from imagekitio.models.UploadFileRequestOptions import UploadFileRequestOptions
-import shutil
+import io
 import os
+import asyncio
+import time
+import hashlib
 import uuid
-import tempfile
-from app.users import auth_backend, current_active_user, fastapi_users
+import base64
+import json
+import orjson
+from datetime import datetime
+from app.users import auth_backend, current_active_user_cached, fastapi_users, UserCtx
 
 @asynccontextmanager #turns function in async context manager, which basically says to do something before and after the block runs.
 async def lifespan(app: FastAPI):
-    await create_db_and_tables()
+    if os.getenv("APP_ENV") == "test":
+        await create_db_and_tables()
+    #real deployments get their tables from the alembic migrations (alembic upgrade head), run once per deploy, so N workers dont all race to create tables on startup
     yield
     #basically means that when FastAPI starts, run the create_db... and when it stops, run whatever comes after yield
 
@@ -29,102 +38,261 @@ app.include_router(fastapi_users.get_reset_password_router(), prefix="/auth", ta
 app.include_router(fastapi_users.get_verify_router(UserRead), prefix="/auth", tags=["auth"]) # purpose is for email verification, usually after registration
 app.include_router(fastapi_users.get_users_router(UserRead, UserUpdate), prefix="/users", tags=["users"]) #allows logged in users to manage their profile and admins to manage all users
 
+FEED_STMT = lambda_stmt(
+    lambda: select(
+        Post.id, Post.user_id, Post.caption, Post.url, Post.file_type, Post.file_name, Post.created_at, User.email,
+        (Post.user_id == bindparam("viewer_id", type_=Post.user_id.type)).label("is_owner")
+    )
+    .outerjoin(User, Post.user_id == User.id)
+    .order_by(Post.created_at.desc(), Post.id.desc())
+)
+#the feed only needs these columns, so we select plain rows instead of building full Post objects that get thrown away straight after
+#is_owner is worked out by the db while it reads each row, it just needs the id of whoever is looking at the feed
+FEED_AFTER_CURSOR = tuple_(Post.created_at, Post.id) < tuple_(bindparam("ts", type_=Post.created_at.type), bindparam("cursor_id", type_=Post.id.type))
+DELETE_OWN_POST = lambda_stmt(lambda: delete(Post).where(Post.id == bindparam("pid"), Post.user_id == bindparam("uid")))
+POST_OWNER_BY_ID = lambda_stmt(lambda: select(Post.user_id).where(Post.id == bindparam("pid")))
+#lambda statements are built and compiled to sql once, then reused from sqlalchemy's cache with new parameter values on every request
+
+MAX_BATCH_UPLOAD_FILES = 10
+
+FEED_CACHE_TTL_SECONDS = 5
+FEED_CACHE_MAX_ENTRIES = 10_000
+_feed_cache: dict[tuple[uuid.UUID, str | None, int], tuple[float, bytes, str]] = {}
+_feed_cache_generation = 0
+
+def invalidate_feed_cache() -> None:
+    """drops every cached feed page after a write, and bumps the generation so pages built before it are never stored"""
+    global _feed_cache_generation
+    _feed_cache_generation += 1
+    _feed_cache.clear()
+
+def encode_cursor(post: RowMapping) -> str:
+    """turns the last post of a page into an opaque cursor the client sends back as ?after="""
+    payload = json.dumps({"ts": post["created_at"].isoformat(), "id": str(post["id"])})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(payload["ts"]), uuid.UUID(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def upload_to_imagekit(source, filename: str):
+    """sends the upload to imagekit. this is a blocking http call, so it must run in a worker thread, not on the event loop"""
+    with io.BufferedReader(source) as reader: # the imagekit sdk only sends the file name along with BufferedReader objects
+        return imagekit.upload_file(
+            file=reader,
+            file_name=filename,
+            options = UploadFileRequestOptions(
+                use_unique_file_name=True,
+                tags=["backend_upload"]
+            )
+        )
+    #the with block closes the file even when the upload raises, so a failing upload cant leave it open
+
+def file_type_of(file: UploadFile) -> str:
+    return 'video' if file.content_type.startswith("video/") else "image"
+
 @app.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
     caption: str = Form(""),
-    user: User = Depends(current_active_user),
+    user: UserCtx = Depends(current_active_user_cached),
     session: AsyncSession = Depends(get_async_session)
     # defined a POST API endpoint that: accepts an uploaded file, accepts a text caption, requires the user to be logged in, uses a db session, performs async logic
 ):
-    temp_file_path = None
-    
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            temp_file_path = temp_file.name
-            shutil.copyfileobj(file.file, temp_file)
-            #creates a temp file and stores the path so i can later open, upload and delete it
-            #lastly, it copies the uploaded frile from FastAPI into the temporary file
+        await file.seek(0)
+        #starlette already keeps small uploads in memory and spools big ones to disk, so we hand that file straight to imagekit instead of copying it into another temp file
         
-        upload_result = imagekit.upload_file(
-            file=open(temp_file_path, "rb"),
-            file_name=file.filename,
-            options = UploadFileRequestOptions(
-                use_unique_file_name=True,
-                tags=["backend_upload"]
-            )
-        )
+        upload_result = await run_in_threadpool(upload_to_imagekit, file.file, file.filename)
+        #the http upload happens in a thread, so other requests keep being served while this one waits on imagekit
         
         if upload_result.response_metadata.http_status_code == 200:
             post = Post(
                 user_id=user.id,
                 caption=caption,
                 url=upload_result.url,
-                file_type='video' if file.content_type.startswith("video/") else "image",
+                file_type=file_type_of(file),
                 file_name=upload_result.name
             )
             session.add(post)
             await session.commit()
+            invalidate_feed_cache()
             await session.refresh(post)
             return post
             #this creates a post in the database. Post(..) creates a new Post object, session.add(post) stages it, commit writes it to db, refresh gets the ID from db and return returns to client
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-        file.file.close()
+        await file.close()
     
-@app.get("/feed")
-async def get_feed(
-    session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_active_user)
+@app.get("/upload/signature")
+async def get_upload_signature(user: UserCtx = Depends(current_active_user_cached)):
+    """gives a logged in client a short lived signature, so it can upload straight to imagekit and the file never passes through this server"""
+    return {**imagekit.get_authentication_parameters(), "public_key": IMAGEKIT_PUBLIC_KEY}
+
+@app.post("/posts")
+async def create_post(
+    post_in: PostCreate,
+    user: UserCtx = Depends(current_active_user_cached),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """saves a post for a file the client already uploaded to imagekit with a signature from /upload/signature"""
+    if not IMAGEKIT_URL or not post_in.url.startswith(IMAGEKIT_URL.rstrip("/") + "/"):
+        raise HTTPException(status_code=400, detail="The url must point to our ImageKit storage.")
+    
+    post = Post(user_id=user.id, **post_in.model_dump())
+    session.add(post)
+    await session.commit()
+    invalidate_feed_cache()
+    await session.refresh(post)
+    return post
+
+@app.post("/upload/batch")
+async def upload_files(
+    files: list[UploadFile] = File(...),
+    caption: str = Form(""),
+    user: UserCtx = Depends(current_active_user_cached),
+    session: AsyncSession = Depends(get_async_session)
 ):
-    result = await session.execute(select(Post).order_by(Post.created_at.desc()))
-    posts = [row[0] for row in result.all()]
+    if len(files) > MAX_BATCH_UPLOAD_FILES:
+        raise HTTPException(status_code=400, detail=f"You can upload at most {MAX_BATCH_UPLOAD_FILES} files at once.")
     
-    result = await session.execute(select(User))
-    users = [row[0] for row in result.all()]
-    user_dict = {u.id: u.email for u in users}
+    try:
+        for file in files:
+            await file.seek(0)
+        upload_results = await asyncio.gather(
+            *[run_in_threadpool(upload_to_imagekit, file.file, file.filename) for file in files],
+            return_exceptions=True
+        )
+        #all files go to imagekit at the same time, each in its own worker thread
+        #one failed file must not throw away the others, they are already stored in imagekit and still need their posts
+        
+        post_rows = []
+        failed = []
+        for file, upload_result in zip(files, upload_results):
+            if isinstance(upload_result, Exception):
+                failed.append({"file_name": file.filename, "detail": str(upload_result)})
+            elif isinstance(upload_result, BaseException):
+                raise upload_result
+            else:
+                post_rows.append(
+                    {
+                        "user_id": user.id,
+                        "caption": caption,
+                        "url": upload_result.url,
+                        "file_type": file_type_of(file),
+                        "file_name": upload_result.name
+                    }
+                )
+        if not post_rows:
+            raise HTTPException(status_code=500, detail={"failed": failed})
+        
+        posts = (await session.scalars(insert(Post).returning(Post), post_rows)).all()
+        await session.commit()
+        invalidate_feed_cache()
+        return {"posts": posts, "failed": failed}
+        #one INSERT for the whole batch and one commit, instead of a commit per file
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for file in files:
+            await file.close()
+
+async def build_feed_page(session: AsyncSession, user: UserCtx, limit: int, after: str | None) -> bytes:
+    """runs the feed query for one page and returns it already serialized to json"""
+    stmt = FEED_STMT
+    params = {"viewer_id": user.id}
+    if after:
+        params["ts"], params["cursor_id"] = decode_cursor(after)
+        stmt += lambda s: s.where(FEED_AFTER_CURSOR)
+    fetch_count = limit + 1
+    stmt += lambda s: s.limit(fetch_count)
+    #keyset pagination: we continue right after the last post the client has seen, so the db walks the (created_at, id) index instead of scanning the whole table
+    posts = (await session.execute(stmt, params)).mappings().all()
+    #the author email comes from the join in the same query, instead of loading every user in the db
     
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    #we ask for one extra row just to know if there is another page
     
     posts_data = []
     for post in posts:
         posts_data.append(
             {
-                "id" : str(post.id),
-                "user_id": str(post.user_id),
-                "caption": post.caption,
-                "url" : post.url,
-                "file_type" : post.file_type,
-                "file_name" : post.file_name,
-                "created_at" : post.created_at.isoformat(),
-                "is_owner": post.user_id == user.id,
-                "email": user_dict.get(post.user_id, "Unknown")
+                "id" : post["id"],
+                "user_id": post["user_id"],
+                "caption": post["caption"],
+                "url" : post["url"],
+                "file_type" : post["file_type"],
+                "file_name" : post["file_name"],
+                "created_at" : post["created_at"],
+                "is_owner": post["is_owner"],
+                "email": post["email"] or "Unknown"
             }
         )
         
-    return {"posts": posts_data}
+    return orjson.dumps({"posts": posts_data, "next_cursor": encode_cursor(posts[-1]) if has_more else None})
+    #orjson writes the uuids and datetimes itself in C, and returning bytes in a Response skips fastapi's slower jsonable_encoder pass
+
+@app.get("/feed")
+async def get_feed(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    after: str | None = None,
+    session: AsyncSession = Depends(get_async_session),
+    user: UserCtx = Depends(current_active_user_cached)
+):
+    cache_key = (user.id, after, limit)
+    cached = _feed_cache.get(cache_key)
+    if cached and cached[0] > time.monotonic():
+        payload, etag = cached[1], cached[2]
+    else:
+        generation = _feed_cache_generation
+        payload = await build_feed_page(session, user, limit, after)
+        etag = f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"'
+        if generation == _feed_cache_generation:
+            if len(_feed_cache) >= FEED_CACHE_MAX_ENTRIES:
+                _feed_cache.clear()
+            _feed_cache[cache_key] = (time.monotonic() + FEED_CACHE_TTL_SECONDS, payload, etag)
+        #if a post was added or deleted while this page was being read, the page may already be out of date, so it is sent but not cached
+    #the feed is read far more often than it changes, so a page is kept for a few seconds and repeat requests skip the db entirely
+    #the key includes the user because is_owner is different for everyone
+    
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    #the client already has exactly this page, so we dont send it again
+    return Response(payload, media_type="application/json", headers={"ETag": etag})
 
 @app.delete("/posts/{post_id}")
-async def delete_post(post_id: str, session: AsyncSession = Depends(get_async_session), user: User = Depends(current_active_user)):
+async def delete_post(post_id: str, session: AsyncSession = Depends(get_async_session), user: UserCtx = Depends(current_active_user_cached)):
     try:
         post_uuid = uuid.UUID(post_id)
         #what is uuid?
+    except ValueError:
+        raise HTTPException(status_code=404, detail = "Post not found")
+    
+    try:
+        result = await session.execute(DELETE_OWN_POST, {"pid": post_uuid, "uid": user.id})
+        await session.commit()
+        if result.rowcount:
+            invalidate_feed_cache()
+        #the ownership check is part of the DELETE itself, so it is one round trip and nobody can change the post between the check and the delete
         
-        result = await session.execute(select(Post).where(Post.id == post_uuid))
-        post = result.scalars().first() #this returns exact result
-        
-        if not post:
-            raise HTTPException(status_code=404, detail = "Post not found")
-        
-        if post.user_id != user.id:
+        if result.rowcount == 0:
+            owner = (await session.execute(POST_OWNER_BY_ID, {"pid": post_uuid})).scalar()
+            #nothing was deleted, this only runs to tell the client why
+            if owner is None:
+                raise HTTPException(status_code=404, detail = "Post not found")
             raise HTTPException(status_code=403, detail = "You don't have permission to delete this post.")
         
-        await session.delete(post)
-        await session.commit()
-        
         return {"success": True, "message": "Post deleted successfully"}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail = str(e))
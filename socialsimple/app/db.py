@@ -1,15 +1,21 @@
 from collections.abc import AsyncGenerator
 import uuid
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index, event, make_url, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, relationship
-from datetime import datetime
+from sqlalchemy.sql import func
 from fastapi_users.db import SQLAlchemyUserDatabase, SQLAlchemyBaseUserTableUUID
+from fastapi_users_db_sqlalchemy.generics import GUID
 from fastapi import Depends
 import os
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://user:pw@localhost/socialsimple")
+if DATABASE_URL.startswith(("postgres://", "postgresql://")):
+    DATABASE_URL = "postgresql+asyncpg://" + DATABASE_URL.split("://", 1)[1]
+    #hosting providers hand out plain postgres:// urls, but the async engine needs the asyncpg driver named explicitly
+
+IS_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
 
 class Base(DeclarativeBase):
     pass
@@ -26,19 +32,69 @@ class Post(Base):
     name = Then either Column (which we use if we are storing data), or Relationship (which we use if storing a relationship), then sepcify what you want in that column or whatever 
     """
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4) # primary key, UUID format
-    user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False) # stores the ID of the user who created the post, and nullable is set to false, so it must always exist
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4 if IS_SQLITE else None,
+        server_default=None if IS_SQLITE else text("gen_random_uuid()")
+    ) # primary key, UUID format. postgres generates it inside the INSERT itself, sqlite has no uuid function so python makes it there
+    user_id = Column(GUID, ForeignKey("user.id"), nullable=False) # stores the ID of the user who created the post, and nullable is set to false, so it must always exist
+    #same column type as user.id, otherwise sqlite stores the two ids in different text formats and joining posts to users finds nothing
     caption = Column(Text) # optional description
     url = Column(String, nullable=False) # where the file is stored
     file_type = Column(String, nullable=False) # image/jepg/...
     file_name = Column(String, nullable=False)#original name
-    created_at = Column(DateTime, default=datetime.utcnow) # timestamp of post creation
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=text("(strftime('%Y-%m-%d %H:%M:%f000', 'now'))") if IS_SQLITE else func.now(),
+        nullable=False
+    ) # timestamp of post creation, set by the db itself on insert
+    #sqlite keeps datetimes as text, so the default has to be written in the same format sqlalchemy uses, or comparing against it (like the feed cursor does) gives wrong results
     
     user = relationship("User", back_populates="posts")
     #we have created a one to many relationship, so one user can basically have many posts
+    
+    __table_args__ = (
+        Index("ix_posts_created_id", created_at.desc(), id.desc()),
+        Index("ix_posts_user_created", user_id, created_at.desc()),
+    )
+    #composite index matching the feed ordering, so paging through the feed is an index range scan instead of sorting the whole table
+    #created_at is its leading column, so it also serves anything that only orders or filters by created_at
+    #the second one does the same for a single user's posts, and means looking posts up by user_id no longer scans the whole table
 
 
-engine = create_async_engine(DATABASE_URL) # this creates tthe database engine, which mannages connections to SQLite
+if IS_SQLITE:
+    sqlite_pool_args = {}
+    if make_url(DATABASE_URL).database not in (None, "", ":memory:"):
+        sqlite_pool_args = {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "25")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "25")),
+        }
+    #only a file database gets a sized pool, in-memory sqlite uses a single shared connection (StaticPool) that doesnt take these arguments
+    engine = create_async_engine(
+        DATABASE_URL,
+        **sqlite_pool_args,
+        connect_args={"check_same_thread": False, "timeout": 30}, # wait up to 30s for the write lock instead of failing straight away
+    )
+    
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL") # readers no longer block on the writer
+        cursor.execute("PRAGMA synchronous=NORMAL") # with WAL this is still safe against corruption, and commits stop waiting on an fsync each time
+        cursor.execute("PRAGMA temp_store=MEMORY") # temporary tables and sort space stay in memory
+        cursor.execute("PRAGMA mmap_size=268435456") # reads the first 256 MB of the file through memory mapping instead of read() calls
+        cursor.execute("PRAGMA cache_size=-65536") # 64 MB page cache per connection (negative means KiB)
+        cursor.close()
+else:
+    engine = create_async_engine(
+        DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "25")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "25")),
+        pool_pre_ping=True, # checks a connection is still alive before handing it out
+        pool_recycle=1800, # replaces connections older than 30 min, before the server or a proxy drops them
+    )
+# this creates the database engine, which manages a pool of connections so requests dont open a new one each time
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False) #this creates a factory that can produce DB sessions. Every time a request needs DB access, fastpi will call this
 
 async def create_db_and_tables():
@@ -4,8 +4,11 @@ import os
 
 load_dotenv()
 
+IMAGEKIT_PUBLIC_KEY = os.getenv("IMAGEKIT_PUBLIC_KEY")
+IMAGEKIT_URL = os.getenv("IMAGEKIT_URL")
+
 imagekit = ImageKit(
     private_key = os.getenv("IMAGEKIT_PRIVATE_KEY"),
-    public_key = os.getenv("IMAGEKIT_PUBLIC_KEY"),
-    url_endpoint = os.getenv("IMAGEKIT_URL")
+    public_key = IMAGEKIT_PUBLIC_KEY,
+    url_endpoint = IMAGEKIT_URL
 )
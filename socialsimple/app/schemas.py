@@ -1,10 +1,13 @@
+from typing import Literal
 from pydantic import BaseModel
 from fastapi_users import schemas
 import uuid
 
 class PostCreate(BaseModel):
-    title: str
-    content: str
+    caption: str = ""
+    url: str
+    file_type: Literal["image", "video"]
+    file_name: str
     
 class PostResponse(BaseModel):
     title: str
@@ -1,7 +1,11 @@
 import uuid
+import time
+from dataclasses import dataclass
 from typing import Optional
-from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, models
+import jwt
+from fastapi import Depends, HTTPException, Request, status
+from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, exceptions, models
+from fastapi_users.jwt import decode_jwt
 from fastapi_users.authentication import (
     AuthenticationBackend,
     BearerTransport,
@@ -41,3 +45,48 @@ auth_backend = AuthenticationBackend(
 
 fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend])
 current_active_user = fastapi_users.current_user(active=True)
+
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_ENTRIES = 10_000
+
+@dataclass(frozen=True)
+class UserCtx:
+    id: uuid.UUID
+    email: str
+    is_superuser: bool
+
+_user_cache: dict[tuple[str, int], tuple[float, UserCtx]] = {}
+
+async def current_active_user_cached(
+    token: str = Depends(bearer_transport.scheme),
+    user_manager: UserManager = Depends(get_user_manager)
+) -> UserCtx:
+    """same check as current_active_user, but remembers the user behind a token for a short while so most requests skip the SELECT on the user table"""
+    strategy = get_jwt_strategy()
+    try:
+        data = decode_jwt(token, strategy.decode_key, strategy.token_audience, algorithms=[strategy.algorithm])
+        key = (data["sub"], data["exp"])
+    except (jwt.PyJWTError, KeyError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    
+    cached = _user_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    try:
+        user = await user_manager.get(user_manager.parse_id(key[0]))
+    except (exceptions.UserNotExists, exceptions.InvalidID):
+        user = None
+    if user is None or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    
+    if len(_user_cache) >= USER_CACHE_MAX_ENTRIES:
+        now = time.monotonic()
+        for stale_key in [k for k, (expires, _) in _user_cache.items() if expires <= now]:
+            del _user_cache[stale_key]
+        if len(_user_cache) >= USER_CACHE_MAX_ENTRIES:
+            _user_cache.clear()
+    
+    user_ctx = UserCtx(id=user.id, email=user.email, is_superuser=user.is_superuser)
+    _user_cache[key] = (time.monotonic() + USER_CACHE_TTL_SECONDS, user_ctx)
+    return user_ctx
@@ -10,6 +10,10 @@ if 'token' not in st.session_state:
     st.session_state.token = None
 if 'user' not in st.session_state:
     st.session_state.user = None
+if 'feed_posts' not in st.session_state:
+    st.session_state.feed_posts = None
+if 'feed_cursor' not in st.session_state:
+    st.session_state.feed_cursor = None
 
 
 def get_headers():
@@ -72,12 +76,35 @@ def upload_page():
 
     if uploaded_file and st.button("Share", type="primary"):
         with st.spinner("Uploading..."):
-            files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-            data = {"caption": caption}
-            response = requests.post("https://socialsimple-1.onrender.com/upload", files=files, data=data, headers=get_headers())
+            # Upload straight to ImageKit with a signature from the backend, then save the post
+            response = requests.get("https://socialsimple-1.onrender.com/upload/signature", headers=get_headers())
+            if response.status_code == 200:
+                signature = response.json()
+                files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+                data = {
+                    "fileName": uploaded_file.name,
+                    "publicKey": signature["public_key"],
+                    "signature": signature["signature"],
+                    "expire": signature["expire"],
+                    "token": signature["token"],
+                    "useUniqueFileName": "true",
+                    "tags": "client_upload",
+                }
+                response = requests.post("https://upload.imagekit.io/api/v1/files/upload", files=files, data=data)
+
+            if response.status_code == 200:
+                uploaded = response.json()
+                post_data = {
+                    "caption": caption,
+                    "url": uploaded["url"],
+                    "file_type": "video" if uploaded_file.type.startswith("video/") else "image",
+                    "file_name": uploaded["name"],
+                }
+                response = requests.post("https://socialsimple-1.onrender.com/posts", json=post_data, headers=get_headers())
 
             if response.status_code == 200:
                 st.success("Posted!")
+                reset_feed()
                 st.rerun()
             else:
                 st.error("Upload failed!")
@@ -111,49 +138,74 @@ def create_transformed_url(original_url, transformation_params, caption=None):
     return f"{base_url}/tr:{transformation_params}/{file_path}"
 
 
-def feed_page():
-    st.title("🏠 Feed")
+def reset_feed():
+    """Forget the loaded feed pages so the next visit starts again from the newest posts"""
+    st.session_state.feed_posts = None
+    st.session_state.feed_cursor = None
+
 
-    response = requests.get("https://socialsimple-1.onrender.com/feed", headers=get_headers())
+def load_feed_page(after=None):
+    """Fetch one page of the feed and add it to the posts already loaded"""
+    params = {"after": after} if after else {}
+    response = requests.get("https://socialsimple-1.onrender.com/feed", params=params, headers=get_headers())
     if response.status_code == 200:
-        posts = response.json()["posts"]
-
-        if not posts:
-            st.info("No posts yet! Be the first to share something.")
-            return
-
-        for post in posts:
-            st.markdown("---")
-
-            # Header with user, date, and delete button (if owner)
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                st.markdown(f"**{post['email']}** • {post['created_at'][:10]}")
-            with col2:
-                if post.get('is_owner', False):
-                    if st.button("🗑️", key=f"delete_{post['id']}", help="Delete post"):
-                        # Delete the post
-                        response = requests.delete(f"https://socialsimple-1.onrender.com/posts/{post['id']}", headers=get_headers())
-                        if response.status_code == 200:
-                            st.success("Post deleted!")
-                            st.rerun()
-                        else:
-                            st.error("Failed to delete post!")
-
-            # Uniform media display with caption overlay
-            caption = post.get('caption', '')
-            if post['file_type'] == 'image':
-                uniform_url = create_transformed_url(post['url'], "", caption)
-                st.image(uniform_url, width=300)
-            else:
-                # For videos: specify only height to maintain aspect ratio + caption overlay
-                uniform_video_url = create_transformed_url(post['url'], "w-400,h-200,cm-pad_resize,bg-blurred")
-                st.video(uniform_video_url, width=300)
-                st.caption(caption)
+        page_data = response.json()
+        st.session_state.feed_posts = (st.session_state.feed_posts or []) + page_data["posts"]
+        st.session_state.feed_cursor = page_data.get("next_cursor")
+    return response.status_code == 200
 
-            st.markdown("")  # Space between posts
-    else:
+
+def feed_page():
+    st.title("🏠 Feed")
+
+    # The feed is paginated - loaded pages are kept between reruns, so only the first page is fetched here
+    if st.session_state.feed_posts is None and not load_feed_page():
         st.error("Failed to load feed")
+        return
+
+    posts = st.session_state.feed_posts
+    if not posts:
+        st.info("No posts yet! Be the first to share something.")
+        return
+
+    for post in posts:
+        st.markdown("---")
+
+        # Header with user, date, and delete button (if owner)
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.markdown(f"**{post['email']}** • {post['created_at'][:10]}")
+        with col2:
+            if post.get('is_owner', False):
+                if st.button("🗑️", key=f"delete_{post['id']}", help="Delete post"):
+                    # Delete the post
+                    response = requests.delete(f"https://socialsimple-1.onrender.com/posts/{post['id']}", headers=get_headers())
+                    if response.status_code == 200:
+                        st.success("Post deleted!")
+                        st.session_state.feed_posts = [p for p in posts if p['id'] != post['id']]
+                        st.rerun()
+                    else:
+                        st.error("Failed to delete post!")
+
+        # Uniform media display with caption overlay
+        caption = post.get('caption', '')
+        if post['file_type'] == 'image':
+            uniform_url = create_transformed_url(post['url'], "", caption)
+            st.image(uniform_url, width=300)
+        else:
+            # For videos: specify only height to maintain aspect ratio + caption overlay
+            uniform_video_url = create_transformed_url(post['url'], "w-400,h-200,cm-pad_resize,bg-blurred")
+            st.video(uniform_video_url, width=300)
+            st.caption(caption)
+
+        st.markdown("")  # Space between posts
+
+    # Only the next page is fetched, starting after the last post already shown
+    if st.session_state.feed_cursor and st.button("Load more"):
+        if load_feed_page(st.session_state.feed_cursor):
+            st.rerun()
+        else:
+            st.error("Failed to load more posts")
 
 
 # Main app logic
@@ -166,6 +218,7 @@ else:
     if st.sidebar.button("Logout"):
         st.session_state.user = None
         st.session_state.token = None
+        reset_feed()
         st.rerun()
 
     st.sidebar.markdown("---")